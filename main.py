@@ -1,13 +1,27 @@
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi import FastAPI, Request, Form, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 import os
 import re
+import asyncio
+import contextvars
+import hmac
+import random
+import threading
+import time
+import httpx
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+    from pyinstrument.session import Session
+except ImportError:  # profiling is optional
+    Profiler = None
+
 # Load environment variables
 load_dotenv()
 
@@ -38,8 +52,31 @@ else:
     print("Warning: Supabase credentials not found in environment variables")
     print("App will run but registration submissions won't be saved")
 
+# Comma-separated list of auth emails allowed to see the admin pages
+ADMIN_EMAILS = {
+    e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()
+}
+
+# How often (seconds) the analytics counters are rebuilt from the source table
+ANALYTICS_RECONCILE_SECONDS = int(os.getenv("ANALYTICS_RECONCILE_SECONDS", "300"))
+
+# Request profiling: send "X-Profile: <PROFILE_TOKEN>" to profile one request,
+# or set PROFILE_SAMPLE_RATE (0.0–1.0) to profile a random fraction of requests.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/datathon-profiles")  # /tmp is the only writable dir on Vercel
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "50"))
+PROFILE_SAMPLE_EXCLUDE = ("/static/", "/admin/profiles")  # never sampled, header still works
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.speedscope\.json$")
+
+# Fire-and-forget upstream calls (emails, sign-outs)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "2"))
+BACKGROUND_RETRIES = int(os.getenv("BACKGROUND_RETRIES", "2"))
+BACKGROUND_MAX_SECONDS = float(os.getenv("BACKGROUND_MAX_SECONDS", "3"))  # retry budget per job
+
 
 # ── Auth helpers ────────────────────────────────────────────
+
 def get_current_user(request: Request):
     """Return the current authenticated user dict or None."""
     access_token = request.cookies.get("access_token")
@@ -100,6 +137,46 @@ def clear_auth_cookies(response: Response):
     response.delete_cookie("refresh_token")
 
 
+def recovery_client() -> Client:
+    """Return a short-lived client for acting as one user (password recovery).
+
+    set_session() stores the user's session on the client it is called on, and
+    table queries then send that user's JWT, so this never touches the shared one.
+    """
+    return create_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=ClientOptions(auto_refresh_token=False, persist_session=False),
+    )
+
+
+def clear_shared_session():
+    """Forget the session stored on the shared client, locally (no network call).
+
+    Login/signup/refresh store the user's session on it and table queries send
+    its JWT until it is cleared; server-side revocation is done separately.
+    gotrue has no public local-only sign-out, so this uses its internals; the
+    version is pinned in requirements.txt for that reason.
+    """
+    supabase.auth._remove_session()
+    supabase.auth._notify_all_subscribers("SIGNED_OUT", None)
+
+
+def revoke_session(access_token: str):
+    """Revoke a session server-side. An already expired/revoked token is a no-op."""
+    try:
+        supabase.auth.admin.sign_out(access_token)
+    except Exception as e:
+        if getattr(e, "status", None) in (401, 403, 404):
+            return
+        raise
+
+
+def is_admin(user) -> bool:
+    """Return True if the user's email is listed in ADMIN_EMAILS."""
+    return bool(user) and (user.get("email") or "").lower() in ADMIN_EMAILS
+
+
 def has_existing_registration(email: str) -> bool:
     """Return True if this auth email has already submitted a team registration."""
     if not supabase:
@@ -172,29 +249,456 @@ def get_problem_statement_counts():
         return {}
 
 
+# ── Page context ────────────────────────────────────────────
+
+async def _load_user(ctx):
+    return await run_in_thread(get_current_user, ctx.request)
+
+
+async def _load_ps_counts(ctx):
+    return await run_in_thread(get_problem_statement_counts)
+
+
+async def _load_registration(ctx):
+    user = await ctx.get("user")
+    if not user:
+        return None
+    return await run_in_thread(get_existing_registration, user["email"])
+
+
+async def _load_already_registered(ctx):
+    user = await ctx.get("user")
+    if not user:
+        return False
+    return await run_in_thread(has_existing_registration, user["email"])
+
+
+class PageContext:
+    """Per-request loader for the data a page renders.
+
+    ``await ctx.load("user", "ps_counts")`` starts every requested value at once
+    (blocking Supabase calls run in worker threads via ``run_in_thread``) and
+    returns them in order; ``ctx.start(...)`` kicks values off without waiting,
+    so a page can check the user and redirect before the rest have arrived.
+    Each value is fetched at most once per request; loaders that depend on
+    another value (e.g. ``registration`` on ``user``) await it via ``ctx.get``.
+    """
+
+    LOADERS = {
+        "user": _load_user,
+        "ps_counts": _load_ps_counts,
+        "registration": _load_registration,
+        "already_registered": _load_already_registered,
+    }
+
+    def __init__(self, request: Request):
+        self.request = request
+        self._tasks = {}
+
+    def get(self, name):
+        if name not in self._tasks:
+            self._tasks[name] = asyncio.ensure_future(self.LOADERS[name](self))
+        return self._tasks[name]
+
+    def start(self, *names):
+        """Begin loading ``names`` in the background without waiting for them."""
+        for name in names:
+            self.get(name)
+
+    async def load(self, *names):
+        return await asyncio.gather(*(self.get(name) for name in names))
+
+
+def page_context(request: Request) -> PageContext:
+    """Return the request's PageContext, creating it on first use."""
+    if not hasattr(request.state, "page_context"):
+        request.state.page_context = PageContext(request)
+    return request.state.page_context
+
+
+# ── Analytics ───────────────────────────────────────────────
+
+class RegistrationStats:
+    """Materialized registration counters, kept in sync with the registrations table.
+
+    Built once from a full scan, then adjusted on every insert/update made through
+    this app, and periodically reconciled against the table to absorb drift (edits
+    made from the Supabase dashboard, other serverless instances, ...).
+    """
+
+    COLUMNS = "problem_statement, university, team_size, registered_at"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.built_at = None
+        self._generation = 0
+
+    def _reset(self):
+        self.total = 0
+        self.by_problem_statement = {}
+        self.by_university = {}
+        self.by_team_size = {}
+        self.by_hour = {}
+
+    @staticmethod
+    def _keys(row):
+        """Return the (ps, university, team_size, hour) counter keys for a row."""
+        registered_at = row.get("registered_at")
+        hour = None
+        if registered_at:
+            try:
+                ts = datetime.fromisoformat(str(registered_at).replace("Z", "+00:00"))
+                hour = ts.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:00Z")
+            except ValueError:
+                hour = None
+        return (
+            row.get("problem_statement") or "unknown",
+            (row.get("university") or "unknown").strip(),
+            row.get("team_size") or 0,
+            hour,
+        )
+
+    @staticmethod
+    def _bump(counter, key, delta):
+        value = counter.get(key, 0) + delta
+        if value > 0:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    def _apply(self, row, delta):
+        ps, university, team_size, hour = self._keys(row)
+        self.total += delta
+        self._bump(self.by_problem_statement, ps, delta)
+        self._bump(self.by_university, university, delta)
+        self._bump(self.by_team_size, team_size, delta)
+        if hour:
+            self._bump(self.by_hour, hour, delta)
+
+    def _rebuild(self, rows):
+        # Caller must hold self._lock
+        self._reset()
+        for row in rows:
+            self._apply(row, 1)
+        self.built_at = datetime.now(timezone.utc)
+
+    def begin_write(self):
+        """Mark a write as in flight; call before the insert/update executes."""
+        with self._lock:
+            self._generation += 1
+
+    def record_insert(self, row):
+        with self._lock:
+            self._generation += 1
+            self._apply(row, 1)
+
+    def record_update(self, old_row, new_row):
+        with self._lock:
+            self._generation += 1
+            self._apply(old_row, -1)
+            self._apply(new_row, 1)
+
+    def reconcile(self):
+        """Rescan the registrations table and replace the counters.
+
+        The swap is skipped (and left to the next cycle) if any write began or
+        was recorded while the scan was in flight: the scan may have missed a
+        row that was then incremented, or seen a row whose increment is still
+        to come, which would count it twice.
+        """
+        if not supabase:
+            return False
+        with self._lock:
+            generation = self._generation
+        try:
+            result = supabase.table("registrations").select(self.COLUMNS).execute()
+        except Exception as e:
+            print(f"Error reconciling analytics: {e}")
+            return False
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._rebuild(result.data)
+        return True
+
+    def is_stale(self):
+        if self.built_at is None:
+            return True
+        age = (datetime.now(timezone.utc) - self.built_at).total_seconds()
+        return ANALYTICS_RECONCILE_SECONDS > 0 and age > ANALYTICS_RECONCILE_SECONDS
+
+    def snapshot(self):
+        """Return a copy of the current counters (independent of table size)."""
+        with self._lock:
+            return {
+                "total": self.total,
+                "by_problem_statement": dict(sorted(self.by_problem_statement.items())),
+                "by_university": dict(
+                    sorted(self.by_university.items(), key=lambda kv: (-kv[1], kv[0]))
+                ),
+                "by_team_size": dict(sorted(self.by_team_size.items())),
+                "by_hour": dict(sorted(self.by_hour.items())),
+                "built_at": self.built_at.isoformat() if self.built_at else None,
+            }
+
+
+registration_stats = RegistrationStats()
+
+
+async def fresh_stats_snapshot():
+    """Snapshot the counters, reconciling first if they are missing or stale.
+
+    Admin reads drive reconciliation so it also happens on serverless hosts,
+    where the startup scan and the loop below may never run or get frozen.
+    """
+    if registration_stats.is_stale():
+        await asyncio.to_thread(registration_stats.reconcile)
+    return registration_stats.snapshot()
+
+
+# Bonus for long-running servers; on Vercel fresh_stats_snapshot() does the work
+async def _reconcile_stats_forever():
+    while True:
+        await asyncio.sleep(ANALYTICS_RECONCILE_SECONDS)
+        await asyncio.to_thread(registration_stats.reconcile)
+
+
+@app.on_event("startup")
+async def start_analytics():
+    await asyncio.to_thread(registration_stats.reconcile)
+    if ANALYTICS_RECONCILE_SECONDS > 0:
+        app.state.analytics_task = asyncio.create_task(_reconcile_stats_forever())
+
+
+@app.on_event("shutdown")
+async def stop_analytics():
+    task = getattr(app.state, "analytics_task", None)
+    if task:
+        task.cancel()
+
+
+# ── Profiling ───────────────────────────────────────────────
+
+def _has_profile_token(request: Request) -> bool:
+    header = request.headers.get("x-profile")
+    if not PROFILE_TOKEN or not header:
+        return False
+    # Compare bytes: compare_digest rejects non-ASCII str, and Starlette decodes
+    # headers as latin-1, so any client could otherwise trigger a TypeError
+    return hmac.compare_digest(header.encode("latin-1"), PROFILE_TOKEN.encode())
+
+
+def _should_sample(request: Request) -> bool:
+    # Keep asset hits and capture downloads from filling the ring buffer
+    if request.url.path.startswith(PROFILE_SAMPLE_EXCLUDE):
+        return False
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+# Sessions recorded in worker threads for the request being profiled (None if not profiled)
+_thread_profiles = contextvars.ContextVar("thread_profiles", default=None)
+
+
+def _profiled_call(sessions, fn, *args):
+    profiler = Profiler(async_mode="disabled")
+    profiler.start()
+    try:
+        return fn(*args)
+    finally:
+        profiler.stop()
+        sessions.append(profiler.last_session)
+
+
+async def run_in_thread(fn, *args):
+    """Like asyncio.to_thread, but also profiles the call when the request is profiled.
+
+    pyinstrument only samples the thread it was started on, so without this the
+    Supabase calls made from worker threads would show up as a bare ``await``.
+    """
+    sessions = _thread_profiles.get()
+    if sessions is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.to_thread(_profiled_call, sessions, fn, *args)
+
+
+def save_profile(session, request: Request):
+    """Write a speedscope capture to PROFILE_DIR, keeping at most PROFILE_MAX_CAPTURES."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w-]+", "_", request.url.path).strip("_") or "root"
+    name = f"{int(time.time() * 1000)}-{request.method}-{slug}.speedscope.json"
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(SpeedscopeRenderer().render(session))
+    # Ring buffer: drop the oldest captures (names sort by timestamp)
+    for old in list_profiles()[PROFILE_MAX_CAPTURES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, old))
+        except OSError:
+            pass
+    return name
+
+
+def list_profiles():
+    """Return capture file names, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted((n for n in os.listdir(PROFILE_DIR) if PROFILE_NAME_RE.match(n)), reverse=True)
+
+
+async def profile_requests(request: Request, call_next):
+    requested = _has_profile_token(request)
+    if not requested and not _should_sample(request):
+        return await call_next(request)
+    thread_sessions = []
+    token = _thread_profiles.set(thread_sessions)
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+        _thread_profiles.reset(token)
+    # Worker-thread samples are merged in as extra roots under _profiled_call
+    session = profiler.last_session
+    for thread_session in thread_sessions:
+        session = Session.combine(session, thread_session)
+    try:
+        # Rendering a large capture is slow; keep it off the event loop
+        name = await asyncio.to_thread(save_profile, session, request)
+        # Only token holders learn the capture name; sampled visitors don't
+        if requested:
+            response.headers["X-Profile-Capture"] = name
+    except Exception as e:
+        print(f"Error saving profile: {e}")
+    return response
+
+
+# Only install the middleware when profiling is configured, so there is no
+# per-request cost otherwise.
+if Profiler and (PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0):
+    app.middleware("http")(profile_requests)
+elif PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    print("Warning: profiling configured but pyinstrument is not installed")
+
+
+# ── Background work ─────────────────────────────────────────
+
+def is_transient_error(exc) -> bool:
+    """Network errors and 5xx are worth retrying; 4xx (rate limits, bad tokens) are not."""
+    status = getattr(exc, "status", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        # gotrue reports network failures as status 0
+        return status == 0 or status >= 500
+    return isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError))
+
+
+class BackgroundWorker:
+    """Runs side-effect upstream calls after the response has been sent.
+
+    Jobs are attached to the response as Starlette background tasks, so they run
+    once the body is sent but still inside the request's ASGI call. That matters
+    on Vercel: work detached from a request can be frozen or dropped as soon as
+    the response returns. Jobs are blocking callables (Supabase SDK calls) run in
+    a thread, at most ``workers`` at a time, and transient failures are retried
+    with exponential backoff, within ``max_seconds`` per job.
+
+    Background tasks still count against the serverless invocation's duration,
+    hence the retry budget.
+    """
+
+    def __init__(self, workers=2, retries=2, backoff=0.5, max_seconds=3):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_seconds = max_seconds
+        self.slots = asyncio.Semaphore(workers)
+        self.metrics = {"submitted": 0, "completed": 0, "retried": 0, "failed": 0, "running": 0}
+
+    def add(self, response: Response, name, fn, *args, cleanup=None, **kwargs):
+        """Schedule ``fn(*args, **kwargs)`` to run after ``response`` is sent.
+
+        ``cleanup`` (if given) is called once the job is finished, after any retries.
+        """
+        if response.background is None:
+            response.background = BackgroundTasks()
+        response.background.add_task(self._run, name, fn, cleanup, *args, **kwargs)
+        self.metrics["submitted"] += 1
+        return response
+
+    async def _run(self, name, fn, cleanup, *args, **kwargs):
+        async with self.slots:
+            self.metrics["running"] += 1
+            deadline = time.monotonic() + self.max_seconds
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        await asyncio.to_thread(fn, *args, **kwargs)
+                        self.metrics["completed"] += 1
+                        return
+                    except Exception as e:
+                        delay = self.backoff * 2 ** attempt
+                        if (
+                            attempt == self.retries
+                            or not is_transient_error(e)
+                            or time.monotonic() + delay > deadline
+                        ):
+                            self.metrics["failed"] += 1
+                            print(f"Background task {name} failed: {e}")
+                            return
+                        self.metrics["retried"] += 1
+                        await asyncio.sleep(delay)
+            finally:
+                self.metrics["running"] -= 1
+                if cleanup:
+                    try:
+                        cleanup()
+                    except Exception as e:
+                        print(f"Background task {name} cleanup failed: {e}")
+
+    def stats(self):
+        return dict(self.metrics)
+
+
+background = BackgroundWorker(
+    workers=BACKGROUND_WORKERS, retries=BACKGROUND_RETRIES, max_seconds=BACKGROUND_MAX_SECONDS
+)
+
+
 # ── Pages ───────────────────────────────────────────────────
 
+# Hero assets for the landing page. Sent as a Link header so the browser can
+# start fetching before it parses <head>; CDNs that support 103 Early Hints
+# (e.g. Cloudflare) turn these into an early response automatically.
+LANDING_PRELOAD_LINKS = ", ".join([
+    "</static/css/style.css>; rel=preload; as=style",
+    "</static/images/girlscript-logo.png>; rel=preload; as=image",
+    "<https://fonts.gstatic.com/s/audiowide/v20/l7gdbjpo0qta49vK0wR3-A.woff2>; rel=preload; as=font; type=font/woff2; crossorigin",
+])
+
 @app.get("/", response_class=HTMLResponse)
 async def landing_page(request: Request):
     """Landing page"""
-    user = get_current_user(request)
-    ps_counts = get_problem_statement_counts()
-    return templates.TemplateResponse(
+    user, ps_counts = await page_context(request).load("user", "ps_counts")
+    response = templates.TemplateResponse(
         "landing.html", 
         {"request": request, "user": user, "ps_counts": ps_counts}
     )
+    response.headers["Link"] = LANDING_PRELOAD_LINKS
+    return response
 
 
 @app.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
     """Registration page (requires login)"""
-    user = get_current_user(request)
+    ctx = page_context(request)
+    # Counts don't depend on the user, so they load alongside auth
+    ctx.start("ps_counts")
+    user = await ctx.get("user")
     if not user:
         return RedirectResponse("/login?next=/register", status_code=302)
-    
-    already_registered = has_existing_registration(user["email"])
-    ps_counts = get_problem_statement_counts()
-    
+
+    already_registered, ps_counts = await ctx.load("already_registered", "ps_counts")
     return templates.TemplateResponse(
         "register.html",
         {
@@ -334,16 +838,11 @@ async def forgot_password_submit(request: Request, email: str = Form(...)):
             "forgot_password.html",
             {"request": request, "error": True, "message": "Auth service unavailable."},
         )
-    try:
-        # Determine the redirect URL for the reset link in the email
-        origin = request.headers.get("origin") or request.base_url
-        redirect_url = f"{str(origin).rstrip('/')}/reset-password"
-        supabase.auth.reset_password_email(email, {"redirect_to": redirect_url})
-    except Exception as e:
-        # Log but don't reveal whether the email exists
-        print(f"Password reset request error: {e}")
+    # Determine the redirect URL for the reset link in the email
+    origin = request.headers.get("origin") or request.base_url
+    redirect_url = f"{str(origin).rstrip('/')}/reset-password"
     # Always show success to prevent email enumeration
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "forgot_password.html",
         {
             "request": request,
@@ -351,6 +850,12 @@ async def forgot_password_submit(request: Request, email: str = Form(...)):
             "message": "If an account with that email exists, you will receive a password reset link shortly. Check your inbox (and spam folder).",
         },
     )
+    # Sent after the response; failures are logged by the worker, never shown,
+    # so the response doesn't reveal whether the email exists
+    return background.add(
+        response, "reset_password_email",
+        supabase.auth.reset_password_email, email, {"redirect_to": redirect_url},
+    )
 
 
 @app.get("/reset-password", response_class=HTMLResponse)
@@ -389,14 +894,14 @@ async def reset_password_submit(
             {"request": request, "error": True, "message": "Auth service unavailable."},
         )
 
+    client = None
     try:
+        client = recovery_client()
         # Set the session from the recovery tokens so we can update the password
-        session = supabase.auth.set_session(access_token, refresh_token)
+        client.auth.set_session(access_token, refresh_token)
         # Now update the user's password
-        supabase.auth.update_user({"password": password})
-        # Sign out the recovery session
-        supabase.auth.sign_out()
-        return templates.TemplateResponse(
+        client.auth.update_user({"password": password})
+        response = templates.TemplateResponse(
             "reset_password.html",
             {
                 "request": request,
@@ -404,7 +909,12 @@ async def reset_password_submit(
                 "message": "Password updated successfully! You can now log in with your new password.",
             },
         )
+        # Sign out the recovery session after responding (the client is ours alone),
+        # then close its HTTP connections
+        return background.add(response, "sign_out", client.auth.sign_out, cleanup=client.auth.close)
     except Exception as e:
+        if client:
+            client.auth.close()
         print(f"Password reset error: {e}")
         msg = str(e)
         if "expired" in msg.lower() or "invalid" in msg.lower():
@@ -423,12 +933,11 @@ async def reset_password_submit(
 async def logout(request: Request):
     resp = RedirectResponse("/", status_code=302)
     clear_auth_cookies(resp)
-    try:
-        token = request.cookies.get("access_token")
-        if token and supabase:
-            supabase.auth.sign_out()
-    except Exception:
-        pass
+    token = request.cookies.get("access_token")
+    if token and supabase:
+        clear_shared_session()
+        # Only the server-side revocation needs a round trip; do it after responding
+        background.add(resp, "sign_out", revoke_session, token)
     return resp
 
 
@@ -436,10 +945,11 @@ async def logout(request: Request):
 
 @app.get("/dashboard", response_class=HTMLResponse)
 async def dashboard_page(request: Request):
-    user = get_current_user(request)
+    ctx = page_context(request)
+    user = await ctx.get("user")
     if not user:
         return RedirectResponse("/login?next=/dashboard", status_code=302)
-    registration = get_existing_registration(user["email"])
+    registration = await ctx.get("registration")
     return templates.TemplateResponse(
         "dashboard.html",
         {"request": request, "user": user, "registration": registration},
@@ -467,12 +977,16 @@ async def submit_registration(
     m4_phone: str = Form(""),
 ):
     """Handle registration form submission (requires login)"""
-    user = get_current_user(request)
+    ctx = page_context(request)
+    ctx.start("ps_counts")
+    user = await ctx.get("user")
     if not user:
         return RedirectResponse("/login?next=/register", status_code=302)
 
+    already_registered, ps_counts = await ctx.load("already_registered", "ps_counts")
+
     # Prevent duplicate registrations
-    if has_existing_registration(user["email"]):
+    if already_registered:
         return templates.TemplateResponse(
             "register.html",
             {
@@ -481,7 +995,7 @@ async def submit_registration(
                 "already_registered": True,
                 "error": True,
                 "message": "You have already registered a team.",
-                "ps_counts": get_problem_statement_counts(),
+                "ps_counts": ps_counts,
                 "max_teams": 10,
             },
         )
@@ -501,7 +1015,6 @@ async def submit_registration(
     # Input validation
     email_re = re.compile(r"^[\w.+-]+@[\w-]+\.[\w.-]+$")
     phone_re = re.compile(r"^[\d\s\+\-()]{7,20}$")
-    ps_counts = get_problem_statement_counts()
     for name, email, phone in members:
         if not name.strip():
             return templates.TemplateResponse(
@@ -559,7 +1072,9 @@ async def submit_registration(
             "registered_at": datetime.now(timezone.utc).isoformat(),
         }
 
+        registration_stats.begin_write()
         response = supabase.table("registrations").insert(data).execute()
+        registration_stats.record_insert(data)
 
         return templates.TemplateResponse(
             "register.html",
@@ -595,15 +1110,18 @@ async def submit_registration(
 @app.get("/edit-registration", response_class=HTMLResponse)
 async def edit_registration_page(request: Request):
     """Show form pre-filled with existing registration data."""
-    user = get_current_user(request)
+    ctx = page_context(request)
+    ctx.start("ps_counts")
+    user = await ctx.get("user")
     if not user:
         return RedirectResponse("/login?next=/edit-registration", status_code=302)
 
-    registration = get_existing_registration(user["email"])
+    registration = await ctx.get("registration")
     if not registration:
         return RedirectResponse("/register", status_code=302)
 
-    ps_counts = get_problem_statement_counts()
+    ps_counts = await ctx.get("ps_counts")
+
     return templates.TemplateResponse(
         "edit_registration.html",
         {
@@ -637,14 +1155,18 @@ async def edit_registration_submit(
     m4_phone: str = Form(""),
 ):
     """Handle edit-registration form submission."""
-    user = get_current_user(request)
+    ctx = page_context(request)
+    ctx.start("ps_counts")
+    user = await ctx.get("user")
     if not user:
         return RedirectResponse("/login?next=/edit-registration", status_code=302)
 
-    registration = get_existing_registration(user["email"])
+    registration = await ctx.get("registration")
     if not registration:
         return RedirectResponse("/register", status_code=302)
 
+    ps_counts = await ctx.get("ps_counts")
+
     team_size = max(1, min(4, team_size))
 
     members = [(m1_name, m1_email, m1_phone)]
@@ -657,7 +1179,6 @@ async def edit_registration_submit(
 
     email_re = re.compile(r"^[\w.+-]+@[\w-]+\.[\w.-]+$")
     phone_re = re.compile(r"^[\d\s\+\-()]{7,20}$")
-    ps_counts = get_problem_statement_counts()
 
     def _render_error(msg):
         return templates.TemplateResponse(
@@ -713,17 +1234,23 @@ async def edit_registration_submit(
             "member4_phone": m4_phone if team_size >= 4 else None,
         }
 
+        registration_stats.begin_write()
         supabase.table("registrations").update(update_data).eq("id", registration["id"]).execute()
+        registration_stats.record_update(registration, {**registration, **update_data})
 
-        # Fetch updated record to show in the form
-        updated_reg = get_existing_registration(user["email"])
+        # Fetch the updated record and counts to show in the form (fresh, not the
+        # pre-update values memoized in the page context)
+        updated_reg, updated_counts = await asyncio.gather(
+            run_in_thread(get_existing_registration, user["email"]),
+            run_in_thread(get_problem_statement_counts),
+        )
         return templates.TemplateResponse(
             "edit_registration.html",
             {
                 "request": request,
                 "user": user,
                 "reg": updated_reg or registration,
-                "ps_counts": get_problem_statement_counts(),
+                "ps_counts": updated_counts,
                 "max_teams": 10,
                 "success": True,
                 "message": "Registration updated successfully!",
@@ -734,10 +1261,60 @@ async def edit_registration_submit(
         return _render_error("Update failed. Please try again or contact support.")
 
 
+# ── Admin ───────────────────────────────────────────────────
+
+@app.get("/admin/analytics", response_class=HTMLResponse)
+async def admin_analytics_page(request: Request):
+    """Live registration stats for organizers."""
+    user = get_current_user(request)
+    if not user:
+        return RedirectResponse("/login?next=/admin/analytics", status_code=302)
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return templates.TemplateResponse(
+        "admin_analytics.html",
+        {"request": request, "user": user, "stats": await fresh_stats_snapshot(), "max_teams": 10},
+    )
+
+
+@app.get("/admin/analytics.json")
+async def admin_analytics_json(request: Request):
+    """Same stats as /admin/analytics, as JSON."""
+    user = get_current_user(request)
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return await fresh_stats_snapshot()
+
+
+@app.get("/admin/profiles")
+async def admin_profiles(request: Request):
+    """List stored profiling captures, newest first."""
+    user = get_current_user(request)
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {"captures": [f"/admin/profiles/{name}" for name in list_profiles()]}
+
+
+@app.get("/admin/profiles/{name}")
+async def admin_profile_download(request: Request, name: str):
+    """Download one capture; open it at https://www.speedscope.app."""
+    user = get_current_user(request)
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    path = os.path.join(PROFILE_DIR, name)
+    if not PROFILE_NAME_RE.match(name) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Capture not found")
+    return FileResponse(path, media_type="application/json", filename=name)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "ok", "supabase_connected": supabase is not None}
+    return {
+        "status": "ok",
+        "supabase_connected": supabase is not None,
+        "background": background.stats(),
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,146 @@
+"""Extract above-the-fold critical CSS for each template.
+
+For every ``templates/*.html`` this collects the tags, classes and ids used
+before the ``<!-- critical-css:fold -->`` marker (or in the whole template if
+there is no marker), keeps the rules of ``static/css/style.css`` that can match
+them, and writes the result to ``templates/critical/<template>`` for the page
+to inline. The full stylesheet is still loaded asynchronously by each page.
+
+Re-run after editing style.css or a template's markup:
+
+    python scripts/build_critical_css.py
+"""
+
+import os
+import re
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+OUTPUT_DIR = os.path.join(TEMPLATES_DIR, "critical")
+STYLESHEET = os.path.join(BASE_DIR, "static", "css", "style.css")
+FOLD_MARKER = "<!-- critical-css:fold -->"
+
+PSEUDO_RE = re.compile(r"::?[\w-]+(\([^)]*\))?")
+ATTR_RE = re.compile(r"\[[^\]]*\]")
+CLASS_RE = re.compile(r"\.([\w-]+)")
+ID_RE = re.compile(r"#([\w-]+)")
+TAG_RE = re.compile(r"(?:^|[\s>+~])([a-zA-Z][\w-]*)")
+
+
+# ── CSS parsing ─────────────────────────────────────────────
+
+def parse_blocks(css):
+    """Split CSS into a list of (prelude, body) pairs at the top nesting level."""
+    blocks = []
+    depth = 0
+    start = 0
+    prelude = ""
+    for i, ch in enumerate(css):
+        if ch == "{":
+            if depth == 0:
+                prelude = css[start:i].strip()
+                start = i + 1
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude, css[start:i]))
+                start = i + 1
+    return blocks
+
+
+def split_selectors(prelude):
+    """Split a selector list on top-level commas (not those inside :is(), etc.)."""
+    parts, depth, current = [], 0, ""
+    for ch in prelude:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    parts.append(current.strip())
+    return [p for p in parts if p]
+
+
+def minify_declarations(body):
+    decls = [d.strip() for d in body.split(";") if d.strip()]
+    return ";".join(re.sub(r"\s*:\s*", ":", re.sub(r"\s+", " ", d), count=1) for d in decls)
+
+
+# ── Template scanning ───────────────────────────────────────
+
+def used_tokens(html):
+    """Return the (tags, classes, ids) used in an HTML fragment."""
+    tags = {t.lower() for t in re.findall(r"<([a-zA-Z][\w-]*)", html)}
+    classes, ids = set(), set()
+    for value in re.findall(r'class="([^"]*)"', html):
+        classes.update(re.findall(r"[\w-]+", value))
+    for value in re.findall(r'id="([^"]*)"', html):
+        ids.update(re.findall(r"[\w-]+", value))
+    return tags, classes, ids
+
+
+def selector_matches(selector, tags, classes, ids):
+    bare = ATTR_RE.sub("", PSEUDO_RE.sub("", selector))
+    return (
+        set(CLASS_RE.findall(bare)) <= classes
+        and set(ID_RE.findall(bare)) <= ids
+        and {t.lower() for t in TAG_RE.findall(bare)} <= tags
+    )
+
+
+def critical_rules(blocks, tags, classes, ids):
+    """Return the minified rules from ``blocks`` that can apply to the given tokens."""
+    out = []
+    for prelude, body in blocks:
+        if prelude.startswith("@media") or prelude.startswith("@supports"):
+            inner = critical_rules(parse_blocks(body), tags, classes, ids)
+            if inner:
+                query = re.sub(r"\s+", " ", prelude)
+                out.append(f"{query}{{{''.join(inner)}}}")
+        elif prelude.startswith("@"):
+            continue  # keyframes are added afterwards, only if referenced
+        else:
+            kept = [s for s in split_selectors(prelude) if selector_matches(s, tags, classes, ids)]
+            if kept:
+                out.append(f"{','.join(kept)}{{{minify_declarations(body)}}}")
+    return out
+
+
+def referenced_keyframes(blocks, rules):
+    css = "".join(rules)
+    out = []
+    for prelude, body in blocks:
+        m = re.match(r"@(?:-webkit-)?keyframes\s+([\w-]+)", prelude)
+        if m and re.search(rf"animation(-name)?:[^;}}]*\b{re.escape(m.group(1))}\b", css):
+            frames = "".join(f"{p}{{{minify_declarations(b)}}}" for p, b in parse_blocks(body))
+            out.append(f"{prelude}{{{frames}}}")
+    return out
+
+
+def build():
+    with open(STYLESHEET) as f:
+        css = re.sub(r"/\*.*?\*/", "", f.read(), flags=re.S)
+    blocks = parse_blocks(css)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(TEMPLATES_DIR, name)) as f:
+            html = f.read().split(FOLD_MARKER)[0]
+        rules = critical_rules(blocks, *used_tokens(html))
+        rules += referenced_keyframes(blocks, rules)
+        critical = "".join(rules)
+        with open(os.path.join(OUTPUT_DIR, name), "w") as f:
+            f.write("{# Generated by scripts/build_critical_css.py — do not edit #}\n")
+            f.write(f"<style>{{% raw %}}{critical}{{% endraw %}}</style>\n")
+        print(f"{name}: {len(critical)} bytes of critical CSS")
+
+
+if __name__ == "__main__":
+    build()
@@ -314,7 +314,12 @@ const HeroGame = (() => {
   return { init, destroy };
 })();
 
-document.addEventListener('DOMContentLoaded', () => {
+// Runs immediately when the script is loaded after DOMContentLoaded (lazy-loaded on the landing page)
+const onReady = (fn) => document.readyState === 'loading'
+    ? document.addEventListener('DOMContentLoaded', fn)
+    : fn();
+
+onReady(() => {
     const statsBar = document.querySelector('.stats-bar');
     if (!statsBar) return;
 